@@ -1,8 +1,20 @@
+import os
+
 from jax import config
 from jaxtyping import install_import_hook
 
 config.update("jax_enable_x64", True)
 
+# Opt-in persistent cache of compiled XLA programs, shared across test runs. Older JAX
+# versions do not expose these options.
+if "GPJAX_JAX_CACHE" in os.environ:
+    try:
+        config.update("jax_compilation_cache_dir", os.environ["GPJAX_JAX_CACHE"])
+        config.update("jax_persistent_cache_min_entry_size_bytes", 0)
+        config.update("jax_persistent_cache_min_compile_time_secs", 0)
+    except AttributeError:
+        pass
+
 # import gpjax within import hook to apply beartype everywhere, before running tests
 with install_import_hook("gpjax", "beartype.beartype"):
     import gpjax  # noqa: F401
@@ -0,0 +1,123 @@
+# Copyright 2023 The GPJax Contributors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+from pathlib import Path
+
+from beartype.typing import (
+    Dict,
+    List,
+    Tuple,
+)
+import jax.random as jr
+from jaxtyping import Float
+import pytest
+
+from gpjax.dataset import Dataset
+from gpjax.decision_making.test_functions.continuous_functions import (
+    AbstractContinuousTestFunction,
+    Forrester,
+    LogarithmicGoldsteinPrice,
+)
+from gpjax.typing import Array
+
+
+def pytest_collection_modifyitems(items: List[pytest.Item]) -> None:
+    # Sampling with tfp causes JAX to raise a UserWarning due to some internal logic
+    # around jnp.argsort, so this is ignored for every test in this directory.
+    test_dir = Path(__file__).parent
+    for item in items:
+        if test_dir in item.path.parents:
+            item.add_marker(pytest.mark.filterwarnings("ignore::UserWarning"))
+
+
+class _Datasets(dict):
+    """
+    Lazily populated cache of datasets, keyed by (function id, seed), so that each
+    test function is only sampled and evaluated once per seed.
+    """
+
+    def __init__(self, test_functions: Dict[str, AbstractContinuousTestFunction]):
+        super().__init__()
+        self.test_functions = test_functions
+
+    def __missing__(self, key: Tuple[str, int]) -> Dataset:
+        function_id, seed = key
+        dataset = self.test_functions[function_id].generate_dataset(
+            num_points=10, key=jr.PRNGKey(seed)
+        )
+        self[key] = dataset
+        return dataset
+
+
+class _TestPoints(dict):
+    """
+    Lazily populated cache of test points, keyed by (function id, number of points,
+    seed). Points are drawn from the search space of the test function using the
+    last key of a three-way split of `jr.PRNGKey(seed)`, so that they never share a
+    key with the samples drawn from `jr.PRNGKey(seed)` or its two-way split.
+    """
+
+    def __init__(self, test_functions: Dict[str, AbstractContinuousTestFunction]):
+        super().__init__()
+        self.test_functions = test_functions
+
+    def __missing__(self, key: Tuple[str, int, int]) -> Float[Array, "N D"]:
+        function_id, num_points, seed = key
+        test_key = jr.split(jr.PRNGKey(seed), 3)[2]
+        test_X = self.test_functions[function_id].generate_test_points(
+            num_points, test_key
+        )
+        self[key] = test_X
+        return test_X
+
+
+@pytest.fixture(scope="session")
+def forrester() -> Forrester:
+    return Forrester()
+
+
+@pytest.fixture(scope="session")
+def log_gp() -> LogarithmicGoldsteinPrice:
+    return LogarithmicGoldsteinPrice()
+
+
+@pytest.fixture(scope="session")
+def test_functions(
+    forrester: Forrester, log_gp: LogarithmicGoldsteinPrice
+) -> Dict[str, AbstractContinuousTestFunction]:
+    return {"forrester": forrester, "loggp": log_gp}
+
+
+@pytest.fixture(scope="session")
+def datasets(
+    test_functions: Dict[str, AbstractContinuousTestFunction]
+) -> _Datasets:
+    return _Datasets(test_functions)
+
+
+@pytest.fixture
+def dummy_dataset(function_id: str, seed: int, datasets: _Datasets) -> Dataset:
+    return datasets[(function_id, seed)]
+
+
+@pytest.fixture(scope="session")
+def forrester_dataset(datasets: _Datasets) -> Dataset:
+    return datasets[("forrester", 42)]
+
+
+@pytest.fixture(scope="session")
+def test_points(
+    test_functions: Dict[str, AbstractContinuousTestFunction]
+) -> _TestPoints:
+    return _TestPoints(test_functions)
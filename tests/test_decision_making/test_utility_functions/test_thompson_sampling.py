@@ -12,21 +12,19 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # ==============================================================================
-from jax import config
-
-config.update("jax_enable_x64", True)
-
-from beartype.typing import Callable
+from beartype.typing import (
+    Dict,
+    Hashable,
+    Tuple,
+)
 import jax.numpy as jnp
 import jax.random as jr
+from jaxtyping import Float
+import numpy as np
 import pytest
 
 from gpjax.dataset import Dataset
-from gpjax.decision_making.test_functions.continuous_functions import (
-    AbstractContinuousTestFunction,
-    Forrester,
-    LogarithmicGoldsteinPrice,
-)
+from gpjax.decision_making.utility_functions.base import SinglePointUtilityFunction
 from gpjax.decision_making.utility_functions.thompson_sampling import ThompsonSampling
 from gpjax.decision_making.utils import OBJECTIVE
 from gpjax.gps import (
@@ -40,10 +38,23 @@ from gpjax.likelihoods import (
     Poisson,
 )
 from gpjax.mean_functions import Zero
-from gpjax.typing import KeyArray
+from gpjax.typing import (
+    Array,
+    KeyArray,
+)
+
+# Posteriors are cached by the identity of the (session-cached) dataset they are built
+# for, so that parametrized tests sharing a dataset also share the posterior.
+_CONJUGATE_POSTERIORS: Dict[int, ConjugatePosterior] = {}
 
 
 def generate_dummy_conjugate_posterior(dataset: Dataset) -> ConjugatePosterior:
+    if id(dataset) not in _CONJUGATE_POSTERIORS:
+        _CONJUGATE_POSTERIORS[id(dataset)] = _build_dummy_conjugate_posterior(dataset)
+    return _CONJUGATE_POSTERIORS[id(dataset)]
+
+
+def _build_dummy_conjugate_posterior(dataset: Dataset) -> ConjugatePosterior:
     kernel = RBF(lengthscale=jnp.ones(dataset.X.shape[1]))
     mean_function = Zero()
     prior = Prior(kernel=kernel, mean_function=mean_function)
@@ -61,169 +72,132 @@ def generate_dummy_non_conjugate_posterior(dataset: Dataset) -> NonConjugatePost
     return posterior
 
 
-@pytest.mark.filterwarnings(
-    "ignore::UserWarning"
-)  # Sampling with tfp causes JAX to raise a UserWarning due to some internal logic around jnp.argsort
-def test_thompson_sampling_no_objective_posterior_raises_error():
-    key = jr.PRNGKey(42)
-    forrester = Forrester()
-    dataset = forrester.generate_dataset(num_points=10, key=key)
-    posterior = generate_dummy_conjugate_posterior(dataset)
-    posteriors = {"CONSTRAINT": posterior}
-    datasets = {OBJECTIVE: dataset}
-    with pytest.raises(ValueError):
-        ts_utility_builder = ThompsonSampling(num_features=100)
-        ts_utility_builder.build_utility_function(
-            posteriors=posteriors, datasets=datasets, key=key
-        )
+# Utility functions are cached across tests by posterior, number of features and key,
+# so that each distinct approximate sample is only drawn once. Posteriors are cached
+# per dataset, so the posterior also identifies the dataset it was built for.
+_UTILITY_FUNCTIONS: Dict[Hashable, SinglePointUtilityFunction] = {}
 
 
-@pytest.mark.filterwarnings(
-    "ignore::UserWarning"
-)  # Sampling with tfp causes JAX to raise a UserWarning due to some internal logic around jnp.argsort
-def test_thompson_sampling_no_objective_dataset_raises_error():
-    key = jr.PRNGKey(42)
-    forrester = Forrester()
-    dataset = forrester.generate_dataset(num_points=10, key=key)
-    posterior = generate_dummy_conjugate_posterior(dataset)
-    posteriors = {OBJECTIVE: posterior}
-    datasets = {"CONSTRAINT": dataset}
-    with pytest.raises(ValueError):
-        ts_utility_builder = ThompsonSampling(num_features=100)
-        ts_utility_builder.build_utility_function(
-            posteriors=posteriors, datasets=datasets, key=key
-        )
-
-
-@pytest.mark.filterwarnings(
-    "ignore::UserWarning"
-)  # Sampling with tfp causes JAX to raise a UserWarning due to some internal logic around jnp.argsort
-def test_thompson_sampling_non_conjugate_posterior_raises_error():
-    key = jr.PRNGKey(42)
-    forrester = Forrester()
-    dataset = forrester.generate_dataset(num_points=10, key=key)
-    posterior = generate_dummy_non_conjugate_posterior(dataset)
-    posteriors = {OBJECTIVE: posterior}
-    datasets = {OBJECTIVE: dataset}
-    with pytest.raises(ValueError):
-        ts_utility_builder = ThompsonSampling(num_features=100)
-        ts_utility_builder.build_utility_function(
-            posteriors=posteriors, datasets=datasets, key=key
+def _cached_build(
+    posterior: ConjugatePosterior,
+    dataset: Dataset,
+    num_features: int,
+    key: KeyArray,
+) -> SinglePointUtilityFunction:
+    cache_key = (id(posterior), num_features, np.asarray(key).tobytes())
+    if cache_key not in _UTILITY_FUNCTIONS:
+        ts_utility_builder = ThompsonSampling(num_features=num_features)
+        _UTILITY_FUNCTIONS[cache_key] = ts_utility_builder.build_utility_function(
+            posteriors={OBJECTIVE: posterior}, datasets={OBJECTIVE: dataset}, key=key
         )
+    return _UTILITY_FUNCTIONS[cache_key]
 
 
-@pytest.mark.parametrize("num_rff_features", [0, -1, -10])
-@pytest.mark.filterwarnings(
-    "ignore::UserWarning"
-)  # Sampling with tfp causes JAX to raise a UserWarning due to some internal logic around jnp.argsort
-def test_thompson_sampling_invalid_rff_num_raises_error(num_rff_features: int):
+@pytest.mark.parametrize(
+    "posterior_tag, dataset_tag, conjugate, num_features",
+    [
+        ("CONSTRAINT", OBJECTIVE, True, 1),
+        (OBJECTIVE, "CONSTRAINT", True, 1),
+        (OBJECTIVE, OBJECTIVE, False, 1),
+        (OBJECTIVE, OBJECTIVE, True, 0),
+        (OBJECTIVE, OBJECTIVE, True, -1),
+        (OBJECTIVE, OBJECTIVE, True, -10),
+    ],
+    ids=[
+        "no_objective_posterior",
+        "no_objective_dataset",
+        "non_conjugate_posterior",
+        "zero_rff_features",
+        "negative_rff_features",
+        "large_negative_rff_features",
+    ],
+)
+def test_thompson_sampling_invalid_inputs_raise_error(
+    posterior_tag: str,
+    dataset_tag: str,
+    conjugate: bool,
+    num_features: int,
+    forrester_dataset: Dataset,
+):
     key = jr.PRNGKey(42)
-    forrester = Forrester()
-    dataset = forrester.generate_dataset(num_points=10, key=key)
-    posterior = generate_dummy_conjugate_posterior(dataset)
-    posteriors = {OBJECTIVE: posterior}
-    datasets = {OBJECTIVE: dataset}
+    dataset = forrester_dataset
+    if conjugate:
+        posterior = generate_dummy_conjugate_posterior(dataset)
+    else:
+        posterior = generate_dummy_non_conjugate_posterior(dataset)
+    posteriors = {posterior_tag: posterior}
+    datasets = {dataset_tag: dataset}
     with pytest.raises(ValueError):
-        ts_utility_builder = ThompsonSampling(num_features=num_rff_features)
+        ts_utility_builder = ThompsonSampling(num_features=num_features)
         ts_utility_builder.build_utility_function(
             posteriors=posteriors, datasets=datasets, key=key
         )
 
 
-@pytest.mark.parametrize(
-    "test_target_function",
-    [(Forrester()), (LogarithmicGoldsteinPrice())],
-)
+@pytest.mark.parametrize("function_id", ["forrester", "loggp"])
 @pytest.mark.parametrize("num_test_points", [50, 100])
-@pytest.mark.parametrize("key", [jr.PRNGKey(42), jr.PRNGKey(10)])
-@pytest.mark.filterwarnings(
-    "ignore::UserWarning"
-)  # Sampling with tfp causes JAX to raise a UserWarning due to some internal logic around jnp.argsort
 def test_thompson_sampling_utility_function_correct_shapes(
-    test_target_function: AbstractContinuousTestFunction,
+    function_id: str,
     num_test_points: int,
-    key: KeyArray,
+    datasets: Dict[Tuple[str, int], Dataset],
+    test_points: Dict[Tuple[str, int, int], Float[Array, "N D"]],
 ):
-    dataset = test_target_function.generate_dataset(num_points=10, key=key)
-    posterior = generate_dummy_conjugate_posterior(dataset)
-    posteriors = {OBJECTIVE: posterior}
-    datasets = {OBJECTIVE: dataset}
-    ts_utility_builder = ThompsonSampling(num_features=100)
-    ts_utility_function = ts_utility_builder.build_utility_function(
-        posteriors=posteriors, datasets=datasets, key=key
-    )
-    test_key, _ = jr.split(key)
-    test_X = test_target_function.generate_test_points(num_test_points, test_key)
-    ts_utility_function_values = ts_utility_function(test_X)
-    assert ts_utility_function_values.shape == (num_test_points, 1)
+    seeds = [42, 10]
+    # The RFF kernel stores its key as a static field, so the builder cannot be traced
+    # under `jax.vmap`; instead we build one utility function per seed, each on its
+    # own dataset, and stack their values.
+    ts_utility_function_values = []
+    for seed in seeds:
+        dataset = datasets[(function_id, seed)]
+        posterior = generate_dummy_conjugate_posterior(dataset)
+        ts_utility_function = _cached_build(
+            posterior, dataset, num_features=4, key=jr.PRNGKey(seed)
+        )
+        test_X = test_points[(function_id, num_test_points, seed)]
+        ts_utility_function_values.append(ts_utility_function(test_X))
+    ts_utility_function_values = jnp.stack(ts_utility_function_values)
+    assert ts_utility_function_values.shape == (len(seeds), num_test_points, 1)
 
 
-@pytest.mark.parametrize(
-    "test_target_function",
-    [(Forrester()), (LogarithmicGoldsteinPrice())],
-)
-@pytest.mark.parametrize("num_test_points", [50, 100])
-@pytest.mark.parametrize("key", [jr.PRNGKey(42), jr.PRNGKey(10)])
-@pytest.mark.filterwarnings(
-    "ignore::UserWarning"
-)  # Sampling with tfp causes JAX to raise a UserWarning due to some internal logic around jnp.argsort
-def test_thompson_sampling_utility_function_same_key_same_function(
-    test_target_function: AbstractContinuousTestFunction,
+@pytest.mark.parametrize("function_id", ["forrester", "loggp"])
+@pytest.mark.parametrize("num_test_points", [8])
+@pytest.mark.parametrize("seed", [42, 10])
+def test_thompson_sampling_determinism(
+    function_id: str,
     num_test_points: int,
-    key: KeyArray,
+    seed: int,
+    dummy_dataset: Dataset,
+    test_points: Dict[Tuple[str, int, int], Float[Array, "N D"]],
 ):
-    dataset = test_target_function.generate_dataset(num_points=10, key=key)
+    key_a = jr.PRNGKey(seed)
+    key_b, _ = jr.split(key_a)
+    dataset = dummy_dataset
     posterior = generate_dummy_conjugate_posterior(dataset)
     posteriors = {OBJECTIVE: posterior}
     datasets = {OBJECTIVE: dataset}
     ts_utility_builder_one = ThompsonSampling(num_features=100)
     ts_utility_builder_two = ThompsonSampling(num_features=100)
-    ts_utility_function_one = ts_utility_builder_one.build_utility_function(
-        posteriors=posteriors, datasets=datasets, key=key
+    ts_utility_function_a1 = ts_utility_builder_one.build_utility_function(
+        posteriors=posteriors, datasets=datasets, key=key_a
     )
-    ts_utility_function_two = ts_utility_builder_two.build_utility_function(
-        posteriors=posteriors, datasets=datasets, key=key
+    ts_utility_function_a2 = ts_utility_builder_two.build_utility_function(
+        posteriors=posteriors, datasets=datasets, key=key_a
     )
-    test_key, _ = jr.split(key)
-    test_X = test_target_function.generate_test_points(num_test_points, test_key)
-    ts_utility_function_one_values = ts_utility_function_one(test_X)
-    ts_utility_function_two_values = ts_utility_function_two(test_X)
-    assert isinstance(ts_utility_function_one, Callable)
-    assert isinstance(ts_utility_function_two, Callable)
-    assert (ts_utility_function_one_values == ts_utility_function_two_values).all()
-
-
-@pytest.mark.parametrize(
-    "test_target_function",
-    [(Forrester()), (LogarithmicGoldsteinPrice())],
-)
-@pytest.mark.parametrize("num_test_points", [50, 100])
-@pytest.mark.parametrize("key", [jr.PRNGKey(42), jr.PRNGKey(10)])
-@pytest.mark.filterwarnings(
-    "ignore::UserWarning"
-)  # Sampling with tfp causes JAX to raise a UserWarning due to some internal logic around jnp.argsort
-def test_thompson_sampling_utility_function_different_key_different_function(
-    test_target_function: AbstractContinuousTestFunction,
-    num_test_points: int,
-    key: KeyArray,
-):
-    dataset = test_target_function.generate_dataset(num_points=10, key=key)
-    posterior = generate_dummy_conjugate_posterior(dataset)
-    posteriors = {OBJECTIVE: posterior}
-    datasets = {OBJECTIVE: dataset}
-    sample_one_key = key
-    sample_two_key, _ = jr.split(key)
-    ts_utility_builder = ThompsonSampling(num_features=100)
-    ts_utility_function_one = ts_utility_builder.build_utility_function(
-        posteriors=posteriors, datasets=datasets, key=sample_one_key
+    ts_utility_function_b = ts_utility_builder_one.build_utility_function(
+        posteriors=posteriors, datasets=datasets, key=key_b
+    )
+    test_X = test_points[(function_id, num_test_points, seed)]
+    ts_utility_function_a1_values = ts_utility_function_a1(test_X)
+    ts_utility_function_a2_values = ts_utility_function_a2(test_X)
+    ts_utility_function_b_values = ts_utility_function_b(test_X)
+    assert callable(ts_utility_function_a1)
+    assert callable(ts_utility_function_a2)
+    assert callable(ts_utility_function_b)
+    assert np.array_equal(
+        np.asarray(ts_utility_function_a1_values),
+        np.asarray(ts_utility_function_a2_values),
     )
-    ts_utility_function_two = ts_utility_builder.build_utility_function(
-        posteriors=posteriors, datasets=datasets, key=sample_two_key
+    assert not np.array_equal(
+        np.asarray(ts_utility_function_a1_values),
+        np.asarray(ts_utility_function_b_values),
     )
-    test_key, _ = jr.split(sample_two_key)
-    test_X = test_target_function.generate_test_points(num_test_points, test_key)
-    ts_utility_function_one_values = ts_utility_function_one(test_X)
-    ts_utility_function_two_values = ts_utility_function_two(test_X)
-    assert isinstance(ts_utility_function_one, Callable)
-    assert isinstance(ts_utility_function_two, Callable)
-    assert not (ts_utility_function_one_values == ts_utility_function_two_values).all()